@@ -0,0 +1,28 @@
+from ..utils.cube import PrevalenceCube
+import pandas as pd
+import numpy as np
+
+
+df = pd.DataFrame({'state': ['NSW', 'NSW', 'QLD', None, 'VIC', 'QLD'],
+                   'age_group': ['15-44', '0-14', '15-44', '45-64', np.nan, '15-44'],
+                   'gender': ['male', 'female', None, 'male', 'female', 'female'],
+                   'pcr': ['P', 'N', 'N', 'P', 'N', 'P']})
+
+
+def test_counts_as_value_counts():
+    cube = PrevalenceCube(df)
+    df_P = df[df.pcr == 'P']
+    assert cube.counts('gender', pcr='P').to_dict() == df_P.gender.value_counts().to_dict()
+    assert cube.counts('state', dropna=False)["None"] == 1
+
+
+def test_crosstab_as_pandas():
+    cube = PrevalenceCube(df)
+    expected = pd.crosstab(df.age_group, df.pcr)
+    assert (cube.crosstab('age_group', 'pcr').values == expected.values).all()
+
+
+def test_update():
+    cube = PrevalenceCube(df.iloc[:2]).update(df.iloc[2:])
+    assert (cube.cube == PrevalenceCube(df).cube).all()
+    assert cube.prevalence('state').to_dict() == {'NSW': 0.5, 'QLD': 0.5, 'VIC': 0.0}
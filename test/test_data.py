@@ -0,0 +1,66 @@
+import os
+
+from ..utils import data
+from ..utils.data import load_map
+import pandas as pd
+import pytest
+import shapely
+
+
+@pytest.fixture
+def map_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(data, '_map_cache', {})
+    return tmp_path
+
+
+def test_labels_and_tolerance(map_cache):
+    full = load_map(None, cache_dir=str(map_cache))
+    simplified = load_map(0.1, cache_dir=str(map_cache))
+
+    centroid = full.geometry.centroid
+    assert (full.label_x == centroid.x).all() and (full.label_y == centroid.y).all()
+    assert (simplified.label_x == full.label_x).all()
+    assert (shapely.get_num_coordinates(simplified.geometry.values).sum()
+            < shapely.get_num_coordinates(full.geometry.values).sum())
+
+
+def test_copy_returned(map_cache):
+    map_df = load_map(cache_dir=str(map_cache))
+    map_df["label_x"] = 0
+    assert (load_map(cache_dir=str(map_cache)).label_x != 0).all()
+
+
+def test_stored_map_reused(map_cache, monkeypatch):
+    map_df = load_map(cache_dir=str(map_cache))
+    assert os.listdir(map_cache) == ['australian-states-0.01.pkl']
+
+    def read_file(fp):
+        raise AssertionError("the stored map should be used")
+
+    monkeypatch.setattr(data, '_map_cache', {})
+    monkeypatch.setattr(data.gpd, 'read_file', read_file)
+    assert load_map(cache_dir=str(map_cache)).equals(map_df)
+
+
+def test_stored_map_rebuilt(map_cache, monkeypatch):
+    map_df = load_map(cache_dir=str(map_cache))
+    fp_cache = str(map_cache / 'australian-states-0.01.pkl')
+
+    # original file newer than the stored map
+    os.utime(fp_cache, (0, 0))
+    monkeypatch.setattr(data, '_map_cache', {})
+    assert load_map(cache_dir=str(map_cache)).equals(map_df)
+    assert os.path.getmtime(fp_cache) > 0
+
+    # stored map which can't be read
+    with open(fp_cache, 'wb') as f:
+        f.write(b'not a pickle')
+    monkeypatch.setattr(data, '_map_cache', {})
+    assert load_map(cache_dir=str(map_cache)).equals(map_df)
+    assert pd.read_pickle(fp_cache).equals(map_df)
+
+
+def test_not_writable_cache(map_cache):
+    (map_cache / 'file').write_text('')
+    cache_dir = str(map_cache / 'file' / 'map')
+    assert len(load_map(cache_dir=cache_dir)) == 8
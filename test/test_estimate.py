@@ -0,0 +1,26 @@
+from ..utils.deduplicate import Duplication
+from ..utils.estimate import DuplicateRateEstimator
+import pandas as pd
+
+
+df = pd.DataFrame({'given_name': ['josjua', 'joshua', 'vanessa', 'vanesa', 'thierry', 'ky'],
+                   'surname': ["whiite", "white", 'bristow', 'bristow', 'ekers', 'laing'],
+                   'state': ["nsw", 'nsw', 'qld', 'qld', 'nsw', 'wa']})
+
+
+def test_full_sample_equals_removed():
+    dupli = Duplication()
+    dupli.detect_duplicates(df)
+
+    estimator = DuplicateRateEstimator(df, Duplication(), random_state=0)
+    rate = estimator.estimate(n_sample=len(df))
+    assert estimator.removed == dupli.removed
+    assert rate.loc['total', 'lower'] == rate.loc['total', 'upper']
+
+
+def test_interval_contains_rate():
+    estimator = DuplicateRateEstimator(df, random_state=0)
+    rate = estimator.estimate(n_sample=3)
+    assert (rate.lower <= rate.rate).all()
+    assert (rate.rate <= rate.upper).all()
+    assert list(rate.index) == ['given_name', 'surname', 'state', 'total']
@@ -0,0 +1,51 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from ..utils.deduplicate import prepare_patient
+from ..utils.lookup import DuplicateLookup
+import pandas as pd
+
+
+df = pd.DataFrame({'patient_id': [1, 2, 3],
+                   'given_name': ['joshua', 'vanessa', 'thierry'],
+                   'surname': ['white', 'bristow', 'ekers'],
+                   'street_number': [4.0, 12.0, None],
+                   'address_1': ['andrea place', 'mountain circuit', 'lowrie street'],
+                   'suburb': ['prospect', 'ellenbrook', 'foxdown'],
+                   'postcode': ['2074', '2305', '4000'],
+                   'state': ['nsw', 'nsw', 'qld'],
+                   'date_of_birth': [19710708.0, 19810905.0, None],
+                   'age': [32.0, 22.0, 40.0],
+                   'phone_number': ['02 97793152', '02 20403934', '07 16836996']})
+
+
+def test_query_typo():
+    lookup = DuplicateLookup(prepare_patient(df))
+    record = dict(df.iloc[0], surname='whiite', phone_number=None)
+    result = lookup.query(record, k=2)
+    assert result.patient_id[0] == 1
+    assert result.duplicate[0]
+
+
+def test_query_new_patient():
+    lookup = DuplicateLookup(prepare_patient(df))
+    record = dict(df.iloc[1], patient_id=4, given_name='alice', surname='conboy',
+                  phone_number='03 71626498', address_1='nyawi place', street_number=7.0)
+    assert not lookup.query(record).duplicate.any()
+
+    lookup.add(record)
+    assert lookup.query(record).patient_id[0] == 4
+
+
+def test_concurrent_queries():
+    lookup = DuplicateLookup(prepare_patient(df))
+    records = [dict(df.iloc[i % 3]) for i in range(30)]
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(lookup.query, records))
+    assert [r.patient_id[0] for r in results] == [1, 2, 3] * 10
+
+
+def test_ties_ordered():
+    twins = pd.concat([df.iloc[[0]]] * 3, ignore_index=True)
+    twins['patient_id'] = [12, 10, 11]
+    lookup = DuplicateLookup(prepare_patient(twins))
+    assert lookup.query(dict(df.iloc[0])).patient_id.tolist() == [10, 11, 12]
@@ -0,0 +1,111 @@
+import importlib.util
+import os
+import sqlite3
+
+from ..utils.data import get_states
+from ..utils.pipeline import Pipeline, Stage, prevalence_pipeline
+import pandas as pd
+
+
+database = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data.db')
+
+
+def double(x):
+    return 2 * x
+
+
+def add(x, y, offset=0):
+    return x + y + offset
+
+
+def make_pipeline(cache_dir, offset=0, cache=True):
+    return Pipeline([Stage("a", double, params={"x": 1}),
+                     Stage("b", double, ["a"]),
+                     Stage("c", double, ["a"]),
+                     Stage("d", add, ["b", "c"], {"offset": offset}, cache=cache)],
+                    cache_dir=cache_dir)
+
+
+def test_run_and_cache(tmp_path):
+    pipeline = make_pipeline(str(tmp_path))
+    assert pipeline.run(['d']) == {'d': 8}
+    assert (pipeline.timings.status == 'computed').all()
+
+    assert pipeline.run(['d']) == {'d': 8}
+    assert pipeline.timings.status.to_dict() == {'a': 'unchanged', 'b': 'unchanged',
+                                                 'c': 'unchanged', 'd': 'cached'}
+
+
+def test_only_downstream_recomputed(tmp_path):
+    make_pipeline(str(tmp_path)).run()
+
+    pipeline = make_pipeline(str(tmp_path), offset=1)
+    assert pipeline.run(['d']) == {'d': 9}
+    assert pipeline.timings.status.to_dict() == {'a': 'unchanged', 'b': 'cached',
+                                                 'c': 'cached', 'd': 'computed'}
+
+
+def test_not_cached_stage(tmp_path):
+    make_pipeline(str(tmp_path), cache=False).run()
+
+    pipeline = make_pipeline(str(tmp_path), cache=False)
+    assert pipeline.run(['d']) == {'d': 8}
+    assert pipeline.timings.status.to_dict() == {'a': 'unchanged', 'b': 'cached',
+                                                 'c': 'cached', 'd': 'computed'}
+    assert not any(fp.name.startswith('d-') for fp in tmp_path.iterdir())
+
+
+def test_keys_follow_depends(tmp_path):
+    fp = tmp_path / 'helpers.py'
+    fp.write_text("def triple(x):\n    return 3 * x\n")
+    spec = importlib.util.spec_from_file_location('helpers', str(fp))
+    helpers = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(helpers)
+
+    def pipeline_keys():
+        return Pipeline([Stage("a", double, params={"x": 1}, depends=[]),
+                         Stage("b", double, ["a"], depends=[double, helpers]),
+                         Stage("c", double, ["a"])]).keys()
+
+    keys = pipeline_keys()
+    fp.write_text("def triple(x):\n    # edited\n    return 3 * x\n")
+    new_keys = pipeline_keys()
+    assert new_keys['a'] == keys['a'] and new_keys['c'] == keys['c']
+    assert new_keys['b'] != keys['b']
+
+
+def test_prevalence_pipeline(tmp_path):
+    # small database : first patients and their tests
+    con = sqlite3.connect(database)
+    patient = pd.read_sql('select * from patient limit 300', con)
+    test = pd.read_sql('select * from test', con)
+    con.close()
+
+    path = str(tmp_path / 'data.db')
+    con = sqlite3.connect(path)
+    patient.to_sql('patient', con, index=False)
+    test[test.patient_id.isin(patient.patient_id)].to_sql('test', con, index=False)
+    con.close()
+
+    report_params = {"output": str(tmp_path / 'report'), "map_cache": str(tmp_path / 'map'),
+                     "processes": 2}
+    pipeline = prevalence_pipeline(path, gender_params={"use_api": False},
+                                   report_params=report_params, cache_dir=str(tmp_path / 'cache'))
+    outputs = pipeline.run(['dedup', 'analysis', 'cube', 'report'])
+    assert (pipeline.timings.status == 'computed').all()
+
+    analysis = outputs['analysis']
+    assert 0 < len(analysis) <= len(test)
+    assert 0 <= outputs['dedup']['removed'] < 1
+    assert set(analysis.pcr) <= {'P', 'N'}
+    assert set(analysis.gender.dropna()) <= {'male', 'female'}
+    assert set(analysis.state.dropna()) <= set(get_states().values())
+    assert outputs['cube'].counts('pcr').equals(analysis.pcr.value_counts()
+                                                .rename_axis('pcr').rename('count'))
+    assert len(outputs['report']) == 6
+
+    outputs = pipeline.run(['analysis', 'report'])
+    assert outputs['analysis'].equals(analysis)
+    status = pipeline.timings.status
+    assert status[status != 'unchanged'].to_dict() == {'analysis': 'cached', 'cube': 'cached',
+                                                       'report': 'computed'}
@@ -0,0 +1,29 @@
+from ..utils.quality import QualityProfiler
+import pandas as pd
+import numpy as np
+
+
+df = pd.DataFrame({'address_1': ['andrea place'] * 12 + ['andrea plaice', 'lowrie street', None],
+                   'postcode': ['2074', '2305', '4000', 'x', None] * 3,
+                   'state': ['nsw', 'wa', 'qld', 'nsw', None] * 3,
+                   'date_of_birth': [19710708.0, 19810905.0, np.nan] * 5,
+                   'age': [49.0, 22.0, 40.0, 10.0, np.nan] * 3})
+
+
+def test_sketch_equals_exact():
+    sketch, exact = QualityProfiler(), QualityProfiler(exact=True)
+    for i in range(0, len(df), 4):
+        sketch.update(df.iloc[i:i + 4])
+        exact.update(df.iloc[i:i + 4])
+
+    assert (exact.distinct() == df.nunique()).all()
+    assert (sketch.distinct() == df.nunique()).all()
+    assert set(sketch.singletons('address_1')) == set(exact.singletons('address_1'))
+    assert sketch.correct_typo('address_1') == {'andrea plaice': 'andrea place'}
+
+
+def test_missing_and_incoherence():
+    profiler = QualityProfiler().update(df)
+    assert (profiler.missing() == df.isna().mean() * 100).all()
+    assert profiler.incoherence == {'postcode_state': 3, 'age': 6}
+    assert profiler.unknown == {'postcode_state': 6, 'age': 7}
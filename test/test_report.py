@@ -0,0 +1,27 @@
+import os
+
+from ..utils.report import make_report
+import pandas as pd
+
+
+df = pd.DataFrame({'state': ['NSW', 'NSW', 'QLD', 'VIC', 'VIC', 'QLD'],
+                   'age_group': ['15-44', '0-14', '15-44', '45-64', '0-14', '15-44'],
+                   'gender': ['male', 'female', 'male', 'male', 'female', 'female'],
+                   'pcr': ['P', 'N', 'N', 'P', 'N', 'P']})
+
+
+def test_report_skips_unchanged(tmp_path):
+    output = str(tmp_path / 'report')
+    map_cache = str(tmp_path / 'map')
+    index = make_report(df, output=output, formats=('png', 'svg'), processes=2,
+                        map_cache=map_cache)
+    assert sorted(index) == ['bar_gender', 'crosstab_positive', 'hist_age',
+                             'map_positive', 'map_ratio']
+    assert os.listdir(map_cache) == ['australian-states-0.01.pkl']
+    assert all(os.path.exists(fp) for figure in index.values() for fp in figure['files'])
+
+    files = {fp: os.path.getmtime(fp) for figure in index.values() for fp in figure['files']}
+    new_index = make_report(df, output=output, formats=('png', 'svg'), processes=2,
+                            map_cache=map_cache)
+    assert new_index == index
+    assert all(os.path.getmtime(fp) == mtime for fp, mtime in files.items())
@@ -0,0 +1,42 @@
+from ..utils.deduplicate import Duplication
+from ..utils.store import ScoreStore
+import pandas as pd
+
+
+def test_redecide_matches_detect(tmp_path):
+    df = pd.DataFrame({'given_name': ['josjua', 'joshua', 'vanessa', 'vanesa', 'thierry'],
+                       'surname': ["whiite", "white", 'bristow', 'bristol', 'ekers'],
+                       'state': ["nsw", 'nsw', 'qld', 'qld', 'nsw']})
+    path = str(tmp_path / 'scores.db')
+    dupli = Duplication(variable_testing=['state'], store=path)
+    kept = dupli.detect_duplicates(df)
+
+    store = ScoreStore(path)
+    assert store.redecide().equals(kept.index)
+    assert store.removed == dupli.removed
+
+    for confidence in [0.5, 0.95]:
+        dupli = Duplication(variable_testing=['state'], confidence=confidence)
+        dupli.detect_duplicates(df)
+        store.redecide(confidence=confidence)
+        assert store.removed == dupli.removed
+
+
+def test_sweep(tmp_path):
+    df = pd.DataFrame({'given_name': ['josjua', 'joshua', 'vanessa', 'thierry'],
+                       'surname': ["whiite", "white", 'bristow', 'ekers'],
+                       'state': ["nsw", 'nsw', 'qld', 'nsw']})
+    path = str(tmp_path / 'scores.db')
+    Duplication(store=path).detect_duplicates(df)
+
+    sweep = ScoreStore(path).sweep(confidence=[0.8, 0.99], threshold=[0.7, 1])
+    assert sweep.shape[0] == 4
+    assert sweep.removed.tolist() == [0.25, 0.25, 0, 0]
+
+
+def test_no_scores_without_store():
+    df = pd.DataFrame({'given_name': ['joshua', 'joshua', 'thierry'],
+                       'state': ['nsw', 'nsw', 'nsw']})
+    dupli = Duplication(variable_testing=['state'])
+    dupli.detect_duplicates(df)
+    assert dupli.scored == []
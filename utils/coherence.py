@@ -46,7 +46,7 @@ def find_best_similar_levenshtein(serie: pd.Series, dict_ref: dict):
 
     all_values = set(serie.values)
 
-    all_values.remove(None)
+    all_values.discard(None)
 
     for i in all_values:
         value_close = process.extractOne(i, dict_ref.values())
@@ -67,7 +67,7 @@ def find_best_similar(serie: pd.Series, dict_ref: dict, similarity: Callable, ap
     """
     
     all_values = set(serie.values)
-    all_values.remove(None)
+    all_values.discard(None)
 
     closest_value = {}
 
@@ -0,0 +1,128 @@
+import pandas as pd
+import numpy as np
+
+
+class PrevalenceCube:
+    """
+    Count cube of the pcr tests over several variables (by default state, age group,
+    gender and pcr result), built in a single pass with categorical codes and
+    np.bincount. Charts slice the cube instead of counting the joined table again,
+    and new rows are added with update.
+
+    Missing values are counted in an extra slot at the end of each dimension.
+
+    Parameters
+    ----------
+    df : dataframe of patients joined with their pcr test
+    dims : variables of the cube
+    """
+
+    def __init__(self, df=None, dims=('state', 'age_group', 'gender', 'pcr')):
+        self.dims = list(dims)
+        self.categories = {dim: [] for dim in self.dims}
+        self.cube = np.zeros([1] * len(self.dims), dtype=np.int64)
+
+        if df is not None:
+            self.update(df)
+
+    def update(self, df):
+        """
+        Add the counts of new rows to the cube.
+        """
+        codes = []
+        for axis, dim in enumerate(self.dims):
+            values = df[dim]
+
+            # add new categories before the slot of missing values
+            categories = self.categories[dim]
+            known = set(categories)
+            new = [v for v in values.dropna().unique() if v not in known]
+            if new:
+                self.cube = np.insert(self.cube, [len(categories)] * len(new), 0, axis=axis)
+                categories.extend(new)
+
+            code = pd.Categorical(values, categories=categories).codes.astype(np.int64)
+            code[code == -1] = len(categories)
+            codes.append(code)
+
+        flat = np.ravel_multi_index(codes, self.cube.shape)
+        self.cube += np.bincount(flat, minlength=self.cube.size).reshape(self.cube.shape)
+        return self
+
+    def counts(self, var, dropna=True, **filters):
+        """
+        Count the values of one variable, as value_counts.
+
+        Parameters
+        ----------
+        var : str, selected variable
+        dropna : bool, if False missing values are counted with the label "None"
+        filters : values retained for the other variables (for example pcr='P')
+
+        Return
+        ------
+        serie : counts sorted in descending order
+        """
+        values = self.__slice__([var], dropna, filters)
+        labels = self.categories[var] + ([] if dropna else ["None"])
+        serie = pd.Series(values, index=pd.Index(labels, name=var), name='count')
+        serie = serie[serie > 0]
+        return serie.sort_values(ascending=False, kind='stable')
+
+    def crosstab(self, index, columns, normalize=False, **filters):
+        """
+        Compute a crosstab between two variables, as pd.crosstab.
+
+        Parameters
+        ----------
+        index : str, variable in rows
+        columns : str, variable in columns
+        normalize : bool, divide the counts by the total
+        filters : values retained for the other variables (for example pcr='P')
+        """
+        values = self.__slice__([index, columns], True, filters)
+        table = pd.DataFrame(values,
+                             index=pd.Index(self.categories[index], name=index),
+                             columns=pd.Index(self.categories[columns], name=columns))
+        table = table.loc[table.sum(axis=1) > 0, table.sum(axis=0) > 0]
+        table = table.sort_index().sort_index(axis=1)
+
+        if normalize:
+            table = table / table.values.sum()
+        return table
+
+    def prevalence(self, var, positive='P'):
+        """
+        Ratio of positive tests over all tests for each value of a variable.
+        """
+        ratio = self.counts(var, pcr=positive) / self.counts(var)
+        return ratio.fillna(0).sort_index().rename('prevalence')
+
+    def project(self, dims):
+        """
+        Return a new cube summed over the variables which are not in dims.
+        """
+        cube = PrevalenceCube(dims=dims)
+        cube.categories = {dim: list(self.categories[dim]) for dim in cube.dims}
+        cube.cube = self.__slice__(cube.dims, False, {})
+        return cube
+
+    def __slice__(self, dims, dropna, filters):
+        """
+        Sum the cube over the variables which are not in dims, after selecting the
+        filtered values. Return an array whose axes follow dims.
+        """
+        cube = self.cube
+        for axis, dim in enumerate(self.dims):
+            if dim in filters:
+                selected = filters[dim] if isinstance(filters[dim], (list, tuple)) else [filters[dim]]
+                positions = [self.categories[dim].index(v) for v in selected
+                             if v in self.categories[dim]]
+                cube = np.take(cube, positions, axis=axis)
+            elif dim in dims and dropna:
+                cube = np.take(cube, range(len(self.categories[dim])), axis=axis)
+
+        summed = tuple(axis for axis, dim in enumerate(self.dims) if dim not in dims)
+        kept = [dim for dim in self.dims if dim in dims]
+        cube = cube.sum(axis=summed)
+        return np.transpose(cube, [kept.index(dim) for dim in dims])
@@ -3,6 +3,7 @@ from genderize import Genderize, GenderizeException
 import json
 import os
 import geopandas as gpd
+import pandas as pd
 
 def get_postcode():
     """
@@ -49,6 +50,10 @@ def get_states():
 
 
 
+_root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_gender_file = os.path.join(_root_dir, 'extern_data', 'gender.json')
+
+
 def get_gender(unique_name):
     """
     Request genderize api to get the gender for each name in a list.
@@ -56,27 +61,76 @@ def get_gender(unique_name):
     """
     try :
         get_gender = Genderize().get(unique_name)
-        fp = os.path.join('extern_data','gender.json')
-        f = open(fp, "w") 
+        f = open(_gender_file, "w") 
         json.dump(get_gender, f)
         f.close()
         return get_gender
 
     except GenderizeException:
         print("Request limit")
-        fp = os.path.join('extern_data','gender.json')
-        if os.path.exists(fp):
-            with open(fp) as data_file:
-                data_loaded = json.load(data_file)
-            return data_loaded
+        if os.path.exists(_gender_file):
+            return load_gender()
+
+
+def load_gender():
+    """
+    Return the last data stored from genderize api.
+    """
+    with open(_gender_file) as data_file:
+        data_loaded = json.load(data_file)
+    return data_loaded
+
+_map_cache = {}
+_map_dir = os.path.join(_root_dir, 'map')
+
+
+def load_map(tolerance=0.01, cache_dir=None):
+    """
+    Return the map of Australia with geometries simplified to a tolerance (in degrees,
+    None keeps the full resolution) and the coordinates of the labels (centroid of 
+    each state). The map is stored in cache_dir (default is the directory of the
+    original file) and kept in memory, so the geometry is only processed once.
+    A stored map which can't be read is built again from the original file, and
+    the map is not stored if cache_dir is not writable.
+    """
+    if tolerance not in _map_cache:
+        if cache_dir is None:
+            cache_dir = _map_dir
+        fp = os.path.join(_map_dir, 'australian-states.json')
+        fp_cache = os.path.join(cache_dir, f'australian-states-{tolerance}.pkl')
+
+        map_df = None
+        if os.path.exists(fp_cache) and os.path.getmtime(fp_cache) >= os.path.getmtime(fp):
+            try:
+                map_df = pd.read_pickle(fp_cache)
+            except Exception:
+                # stored with other versions of geopandas / shapely
+                map_df = None
+
+        if map_df is None:
+            map_df = gpd.read_file(fp)
+            centroid = map_df.geometry.centroid
+            map_df["label_x"] = centroid.x
+            map_df["label_y"] = centroid.y
+            if tolerance is not None:
+                map_df["geometry"] = map_df.geometry.simplify(tolerance, preserve_topology=True)
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                map_df.to_pickle(fp_cache)
+            except OSError:
+                print(f"The map can't be stored in {cache_dir}")
+
+        _map_cache[tolerance] = map_df
+
+    return _map_cache[tolerance].copy()
+
 
-def get_map(dict_ref):
+def get_map(dict_ref, tolerance=0.01, cache_dir=None):
     """
     Download the map of Australia and return a geopandas dataframe with states'
-    GPS coordinates.
+    GPS coordinates (see load_map for the tolerance and cache_dir).
     """
-    fp = os.path.join('map','australian-states.json')
-    map_df = gpd.read_file(fp)
+    map_df = load_map(tolerance, cache_dir)
     map_df["state"] = map_df.STATE_NAME.replace(dict_ref)
     map_df = map_df.set_index("state")
     map_df["STATE_CODE"] = map_df.index
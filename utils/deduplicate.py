@@ -2,6 +2,8 @@ from jellyfish import jaro_winkler_similarity
 import pandas as pd
 import numpy as np
 
+from .store import save_scores
+
 
 class Duplication:
     """
@@ -16,10 +18,14 @@ class Duplication:
     confidence : retained threshold for the similarity between two values
     threshold : pourcentage of identical values considered to assess if an observation is duplicate
     metric : function to compare string (default is Jaro Winkler similarity)
+    store : str, SQLite file where candidate pairs and their raw scores are saved 
+        to re-decide duplicates with other settings (see utils.store.ScoreStore). 
+        The file also contains the patient values of var_threshold and var_similarity
     """
     
     def __init__(self, variable_testing=None, var_threshold=None, df_pcr=None, var_similarity=None, 
-                confidence=0.8, threshold=0.7, metric=None, remove_dupli_pi=False):
+                confidence=0.8, threshold=0.7, metric=None, remove_dupli_pi=False, 
+                store=None):
 
         self.var_threshold = var_threshold
         self.var_similarity = var_similarity
@@ -28,6 +34,7 @@ class Duplication:
         self.variable_testing = variable_testing
         self.df_pcr = df_pcr
         self.remove_dupli_pi = remove_dupli_pi  
+        self.store = store
         
         if metric is None:
             self.metric = jaro_winkler_similarity
@@ -46,6 +53,7 @@ class Duplication:
         """
 
         df_patient_init = df_patient.copy()
+        self.scored = []
 
         if self.variable_testing is None:
             self.variable_testing = df_patient.columns
@@ -75,6 +83,10 @@ class Duplication:
         self.removed = round(
             1 - (df_patient.shape[0] / df_patient_init.shape[0]), 2)
 
+        # save candidate pairs and raw scores to re-decide without recomputation
+        if self.store is not None:
+            save_scores(self.store, df_patient_init, self, self.scored)
+
         return df_patient
 
     def __get_indice_duplicated__(self, df_patient, df_pcr, variable, all_dupli):
@@ -191,6 +203,7 @@ class Duplication:
             if not(line == ref_index):
 
                 var_identical = {}
+                raw = []
                 
                 # For each column of each row (excluding the reference 
                 # index) compute the similarity between two strings (with an 
@@ -201,16 +214,23 @@ class Duplication:
                     var_identical["index"] = line
 
                     if var in var_similarity:
-
-                        var_identical[var] = self.metric(cluster.loc[line, var],
-                                                    cluster.loc[ref_index, var]) > self.confidence
+                        score = self.metric(cluster.loc[line, var],
+                                            cluster.loc[ref_index, var])
+                        var_identical[var] = score > self.confidence
 
                     else:
-                        var_identical[var] = cluster.loc[line, var] == cluster.loc[
+                        score = cluster.loc[line, var] == cluster.loc[
                         ref_index, var]
+                        var_identical[var] = score
+
+                    if self.store is not None:
+                        raw.append(float(score))
 
                 matching.append(var_identical)
 
+                if self.store is not None:
+                    self.scored.append((line, ref_index, raw))
+
         dataframe = pd.DataFrame(matching).set_index('index')
         dataframe.index.name = None
         return dataframe
@@ -247,6 +267,35 @@ class Duplication:
             df_pcr.patient_id[is_positive.index[is_positive]])].index
 
 
+def prepare_fields(date_of_birth, age, street_number, postcode, state, suburb, 
+                   address_1, surname, given_name):
+    """
+    Create the fields of one patient (missing values are empty strings) : 
+    born_age, street_number, localisation, full_address and full_name.
+    """
+    # born and age
+    born_age = str(date_of_birth).replace('.0', '').replace('nan','') + " " + str(
+        age).replace('.0','').replace('nan','')
+
+    # localisation (postcode, suburb and state)
+    street_number = str(int(float(street_number or 0)))
+    street_number = "" if street_number == "0" else street_number
+    localisation = str(postcode) + " " + str(state) + " " + str(suburb)
+
+    # full address (number and adress)
+    full_address = street_number + " " + str(address_1)
+
+    # full name (surname and given name)
+    full_name = str(surname) + " " + str(given_name)
+
+    return born_age, street_number, localisation, full_address, full_name
+
+
+PREPARED_FROM = ["date_of_birth", "age", "street_number", "postcode", "state", "suburb", 
+                 "address_1", "surname", "given_name"]
+PREPARED = ["born_age", "street_number", "localisation", "full_address", "full_name"]
+
+
 def prepare_patient(df_patient):
     """
     Prepare dataframe patient. This function create :
@@ -254,23 +303,11 @@ def prepare_patient(df_patient):
     """
 
     df_patient = df_patient.fillna('')
+    fields = [prepare_fields(*values) for values in zip(
+        *[df_patient[col] for col in PREPARED_FROM])]
     
-    # born and age
-    df_patient["born_age"] = df_patient.apply(lambda x: str(
-    	x["date_of_birth"]).replace('.0', '').replace('nan','') + " " + str(
-    	x["age"]).replace('.0','').replace('nan',''), axis=1)
-    
-    # localisation (postcode, suburb and state)
-    df_patient.street_number = df_patient.street_number.replace(
-        {"": 0}).astype(int).astype(str).replace({"0": ""})
-    df_patient["localisation"] = df_patient.apply(lambda x : x["postcode"] + " " + 
-    	x["state"] + " " + x["suburb"], axis=1)
-    
-    # full address (number and adress)
-    df_patient["full_address"] = df_patient.apply(lambda x : x["street_number"] + " " 
-                                                  + x["address_1"], axis=1)
-    # full name (surname and given name)
-    df_patient["full_name"] = df_patient["surname"] + " " + df_patient["given_name"]
+    for col, values in zip(PREPARED, zip(*fields)):
+        df_patient[col] = list(values)
     
     return df_patient
 
@@ -283,3 +320,15 @@ def prepare_pcr(df_pcr, positive_pi, not_dupli_pcr):
     df_pcr = df_pcr.drop_duplicates(keep=False, subset=["patient_id"])
     df_pcr = pd.concat([df_pcr, keep])
     return df_pcr
+
+
+def prepare_record(record):
+    """
+    Prepare a single patient record (dictionary) the same way as prepare_patient. 
+    This function create : localisation, full_address, full_name and born_age.
+    """
+    record = {k: '' if v is None or (isinstance(v, float) and np.isnan(v)) else v 
+              for k, v in record.items()}
+    fields = prepare_fields(*[record.get(col, '') for col in PREPARED_FROM])
+    record.update(zip(PREPARED, fields))
+    return record
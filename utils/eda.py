@@ -159,17 +159,21 @@ def plot_map(data, var, cmap='Blues', size_fig=(14, 8),
               cmap=cmap,
               linewidth=0.8, edgecolor='0.8', ax=ax)
     
-    if anno_state:
-        data.apply(lambda x: ax.text(s=x.STATE_CODE,
-                                         x=x.geometry.centroid.coords[0][0],
-                                         y=x.geometry.centroid.coords[0][1]+2,
-                                         ha='center', size=10, fontweight='bold', 
-                                         color=color_font), axis=1)
-    if anno_value:
-        data.apply(lambda x: ax.text(s=x[var],
-                                         x=x.geometry.centroid.coords[0][0], 
-                                         y=x.geometry.centroid.coords[0][1],
-                                         ha='center', size=10, color=color_font), axis=1)
+    # label coordinates are precomputed by get_map, else computed once here
+    if anno_state or anno_value:
+        if "label_x" in data.columns:
+            label_x, label_y = data.label_x, data.label_y
+        else:
+            centroid = data.geometry.centroid
+            label_x, label_y = centroid.x, centroid.y
+
+        if anno_state:
+            for state, lx, ly in zip(data.STATE_CODE, label_x, label_y):
+                ax.text(s=state, x=lx, y=ly+2, ha='center', size=10, 
+                        fontweight='bold', color=color_font)
+        if anno_value:
+            for value, lx, ly in zip(data[var], label_x, label_y):
+                ax.text(s=value, x=lx, y=ly, ha='center', size=10, color=color_font)
     ax.axis('off')
     ax.set_title(title)
 
@@ -177,25 +181,30 @@ def plot_map(data, var, cmap='Blues', size_fig=(14, 8),
 
 def plot_bar_PN(df_N, df_P, var, title='', 
                 y=0, x=0, figsize=(12,4), 
-                sort=True, print_none=True, ax=None):
+                sort=True, print_none=True, ax=None, cube=None):
     """
     Plot two bar graphs from two dataframes (positive and negative pcr test).
 
     Parameters
     ----------
-    df_N : pd.Dataframe, dataframe where column pcr is negative
-    df_P : pd.Dataframe where column pcr is positive
+    df_N : pd.Dataframe, dataframe where column pcr is negative (None with cube)
+    df_P : pd.Dataframe where column pcr is positive (None with cube)
     var : str, selected columns
     sort : bool, sort bar
     print_none : bool, show NA bar
     ax : ax object, default None
+    cube : PrevalenceCube, counts are sliced from the cube instead of df_N and df_P
     """
-    if print_none : 
-        df_N = df_N.replace(np.nan, "None") 
-        df_P = df_P.replace(np.nan, "None")
+    if cube is not None:
+        count_N = cube.counts(var, dropna=not print_none, pcr='N')
+        count_P = cube.counts(var, dropna=not print_none, pcr='P')
+    else:
+        if print_none : 
+            df_N = df_N.replace(np.nan, "None") 
+            df_P = df_P.replace(np.nan, "None")
     
-    count_N = df_N[var].value_counts()
-    count_P = df_P[var].value_counts()
+        count_N = df_N[var].value_counts()
+        count_P = df_P[var].value_counts()
     
     if sort:
         count_N = count_N.sort_index()
@@ -232,7 +241,8 @@ def plot_crosstab(data, size=(12,8), ax=None, title=''):
 
     Parameters 
     -----------
-    data : dataframe, pandas crosstab between two variables 
+    data : dataframe, crosstab between two variables as returned by
+        cube.crosstab(...) (see PrevalenceCube.crosstab) or pd.crosstab
     size : tuple, size of graphic
     ax : ax object, default None
     title : str, name of graphic
@@ -266,7 +276,7 @@ def plot_dist(df1, df2, size=(12,7), ax=None, bins=50, title="", label=('','')):
     ax.legend()
 
 
-def plot_hist_age(df, ax=None, x=(0,0), y=(0,0), ylabel='', title=''):
+def plot_hist_age(df, ax=None, x=(0,0), y=(0,0), ylabel='', title='', cube=None):
     """
     Plot a histogram by age group for each test result (P or N).
 
@@ -277,11 +287,15 @@ def plot_hist_age(df, ax=None, x=(0,0), y=(0,0), ylabel='', title=''):
     ylabel : str, name of label
     title : str, name of graph
     ax : ax object, default None
+    cube : PrevalenceCube, counts are sliced from the cube instead of df
     """
     b = (0.45, 0.61, 0.8)
     r = (0.64, 0.2, 0.17)
 
-    d_a = df.groupby(['age_group', 'pcr'])['pcr'].count().unstack()
+    if cube is not None:
+        d_a = cube.crosstab('age_group', 'pcr')
+    else:
+        d_a = df.groupby(['age_group', 'pcr'])['pcr'].count().unstack()
 
     d_a.plot.bar(color=(b,r), ax=ax, width=0.5)
     ax.set_ylabel(ylabel)
@@ -0,0 +1,162 @@
+from statistics import NormalDist
+
+import pandas as pd
+import numpy as np
+
+from .deduplicate import Duplication
+from .reference import reference_priority
+
+
+class DuplicateRateEstimator:
+    """
+    Estimate the pourcentage of duplicates (the attribute removed of Duplication)
+    from a sample of records, without running detect_duplicates on the whole table.
+
+    For each sampled record, its cluster is found for each testing variable through
+    a blocking index, and the record is compared to the reference observation of the
+    cluster with the settings of the Duplication object. The observations removed by
+    earlier testing variables are resolved lazily (and memoized), so the estimate
+    follows detect_duplicates and equals removed when the whole table is sampled.
+
+    Parameters
+    ----------
+    df_patient : dataframe of patients (prepared with prepare_patient)
+    duplication : Duplication object giving the settings (default is Duplication())
+    random_state : int, seed of the sampling
+    """
+
+    def __init__(self, df_patient, duplication=None, random_state=None):
+
+        if duplication is None:
+            duplication = Duplication()
+
+        self.duplication = duplication
+        self.variable_testing = list(df_patient.columns if duplication.variable_testing is None
+                                     else duplication.variable_testing)
+        self.var_similarity = set(df_patient.columns if duplication.var_similarity is None
+                                  else duplication.var_similarity)
+        var_threshold = list(df_patient.columns if duplication.var_threshold is None
+                             else duplication.var_threshold)
+
+        self.n = len(df_patient)
+        self.values = {var: df_patient[var].values for var in var_threshold}
+        self.patient_id = df_patient.patient_id.values if 'patient_id' in df_patient.columns else None
+
+        # detect_duplicates keeps the input order for the first variable,
+        # then the dataframe is sorted by index
+        priority = reference_priority(df_patient, duplication.df_pcr)
+        sorted_order = np.argsort(np.argsort(df_patient.index, kind='stable'))
+
+        # blocking index for each testing variable : cluster code of each
+        # observation and members of each cluster in reference order
+        self.codes = []
+        self.members = []
+        for k, variable in enumerate(self.variable_testing):
+            codes = pd.factorize(df_patient[variable])[0]
+            order = np.arange(self.n) if k == 0 else sorted_order
+            idx = np.flatnonzero(codes >= 0)
+            idx = idx[np.lexsort((order[idx], -priority[idx], codes[idx]))]
+            bounds = np.flatnonzero(np.r_[True, np.diff(codes[idx]) != 0, True])
+            self.codes.append(codes)
+            self.members.append([idx[a:b] for a, b in zip(bounds[:-1], bounds[1:])])
+
+        self.sample = np.random.RandomState(random_state).permutation(self.n)
+        self._removed_at = {}
+
+    def estimate(self, n_sample=1000, level=0.95):
+        """
+        Estimate the pourcentage of duplicates from the first n_sample records of
+        a random permutation. Growing n_sample reuses the records already evaluated.
+
+        Parameters
+        ----------
+        n_sample : int, number of sampled records
+        level : float, level of the confidence intervals
+
+        Return
+        ------
+        dataframe : estimated rate with its confidence interval for each testing
+            variable and in total
+        """
+        n_sample = min(n_sample, self.n)
+        stages = [self.__stage__(pos) for pos in self.sample[:n_sample]]
+
+        names = self.variable_testing + (['patient_id'] if self.duplication.remove_dupli_pi else [])
+        count = pd.Series(stages).value_counts()
+        rows = {name: self.__interval__(count.get(k, 0), n_sample, level)
+                for k, name in enumerate(names)}
+        rows["total"] = self.__interval__(count.sum() - count.get(-1, 0), n_sample, level)
+
+        dataframe = pd.DataFrame(rows, index=['rate', 'lower', 'upper']).T
+        self.removed = round(dataframe.loc['total', 'rate'], 2)
+        return dataframe
+
+    def __interval__(self, count, n_sample, level):
+        """
+        Wilson interval of a proportion, with the finite population correction.
+        """
+        p = count / n_sample
+        if n_sample == self.n:
+            return p, p, p
+
+        n_eff = n_sample * (self.n - 1) / (self.n - n_sample)
+        z = NormalDist().inv_cdf(0.5 + level / 2)
+        center = (p + z ** 2 / (2 * n_eff)) / (1 + z ** 2 / n_eff)
+        half = z * np.sqrt(p * (1 - p) / n_eff + z ** 2 / (4 * n_eff ** 2)) / (1 + z ** 2 / n_eff)
+        return p, min(max(center - half, 0), p), max(min(center + half, 1), p)
+
+    def __stage__(self, pos):
+        """
+        Return the position of the testing variable removing an observation
+        (len(variable_testing) for duplicated patient id), or -1 if it is kept.
+        """
+        for k in range(len(self.variable_testing)):
+            if self.__removed__(pos, k):
+                return k
+
+        if self.duplication.remove_dupli_pi and self.patient_id is not None:
+            same_id = np.flatnonzero(self.patient_id == self.patient_id[pos])
+            if sum(self.__alive__(i, len(self.variable_testing)) for i in same_id) > 1:
+                return len(self.variable_testing)
+        return -1
+
+    def __alive__(self, pos, k):
+        """
+        Return True if an observation is not removed before the testing variable k.
+        """
+        return not any(self.__removed__(pos, j) for j in range(k))
+
+    def __removed__(self, pos, k):
+        """
+        Return True if an observation, kept until the testing variable k, is
+        removed by this variable.
+        """
+        key = (pos, k)
+        if key not in self._removed_at:
+            code = self.codes[k][pos]
+            removed = False
+
+            if code >= 0:
+                # reference observation : first member still in the table
+                for ref in self.members[k][code]:
+                    if ref == pos or self.__alive__(ref, k):
+                        break
+                removed = ref != pos and self.__is_duplicate__(pos, ref)
+
+            self._removed_at[key] = removed
+        return self._removed_at[key]
+
+    def __is_duplicate__(self, line, ref):
+        """
+        Compare an observation to the reference observation as in Duplication.
+        """
+        duplication = self.duplication
+        n_identical = 0
+
+        for var, values in self.values.items():
+            if var in self.var_similarity:
+                n_identical += duplication.metric(values[line], values[ref]) > duplication.confidence
+            else:
+                n_identical += values[line] == values[ref]
+
+        return n_identical / len(self.values) >= duplication.threshold
@@ -0,0 +1,137 @@
+import threading
+from collections import defaultdict
+
+from jellyfish import soundex
+import pandas as pd
+
+from .deduplicate import Duplication, prepare_record
+
+
+def default_blocking():
+    """
+    Return a dictionary where keys are the names of the blocking indexes and
+    values are functions computing the blocking key of a prepared record.
+    """
+    return {"phone": lambda x: x.get("phone_number", ''),
+            "name": lambda x: x.get("full_name", ''),
+            "name_sound": lambda x: soundex(str(x.get("surname", ''))) + " " + str(
+                x.get("given_name", ''))[:1] if x.get("surname") else '',
+            "address": lambda x: x.get("full_address", ''),
+            "address_sound": lambda x: str(x.get("street_number", '')) + " " + soundex(
+                str(x.get("address_1", ''))) + " " + str(x.get("postcode", ''))
+                if x.get("address_1") else ''}
+
+
+class DuplicateLookup:
+    """
+    Find if a single record already exists in a deduplicated patient table. Candidates
+    are retrieved from in-memory blocking indexes (phone, name and address keys) and
+    compared to the record with the metric and the thresholds of a Duplication object.
+    Queries only read the indexes, so several threads can query at the same time,
+    while add is serialized by a lock.
+
+    Parameters
+    ----------
+    df_patient : dataframe of deduplicated patients, prepared with prepare_patient
+    duplication : Duplication object giving metric, confidence, threshold, var_similarity
+        and var_threshold (default is Duplication())
+    blocking : dictionary of blocking key functions (default is default_blocking())
+    """
+
+    def __init__(self, df_patient, duplication=None, blocking=None):
+
+        if duplication is None:
+            duplication = Duplication()
+        if blocking is None:
+            blocking = default_blocking()
+
+        self.metric = duplication.metric
+        self.confidence = duplication.confidence
+        self.threshold = duplication.threshold
+        # a new record has no patient_id yet, so it is never compared
+        columns = df_patient.columns.drop('patient_id', errors='ignore')
+        self.var_threshold = [var for var in (columns if duplication.var_threshold is None
+                              else duplication.var_threshold) if var != 'patient_id']
+        self.var_similarity = set(columns if duplication.var_similarity is None
+                                  else duplication.var_similarity)
+        self.blocking = blocking
+
+        # precomputed fields of each patient and blocking indexes (key -> positions)
+        self.patient_id = []
+        self.fields = []
+        self.index = {name: defaultdict(list) for name in blocking}
+        self._lock = threading.Lock()
+
+        has_id = 'patient_id' in df_patient.columns
+        for i, record in enumerate(df_patient.to_dict('records')):
+            self.__insert__(record, record["patient_id"] if has_id else df_patient.index[i])
+
+    def add(self, record, patient_id=None):
+        """
+        Add a new patient to the indexes.
+        """
+        record = prepare_record(record)
+        with self._lock:
+            self.__insert__(record, record.get("patient_id") if patient_id is None else patient_id)
+
+    def query(self, record, k=5):
+        """
+        Find the patients most similar to a record.
+
+        Parameters
+        ----------
+        record : dictionary, raw patient record (as in the patient table)
+        k : int, number of candidates returned
+
+        Return
+        ------
+        dataframe : top-k candidates with patient_id, the similarity of each variable
+            of var_threshold, the matching score and if the candidate is a duplicate
+        """
+        record = prepare_record(record)
+
+        candidates = set()
+        for name, key in self.blocking.items():
+            value = key(record)
+            if str(value).strip():
+                candidates.update(list(self.index[name].get(value, ())))
+
+        results = []
+        for pos in candidates:
+            fields = self.fields[pos]
+            similarity = {"patient_id": self.patient_id[pos]}
+            n_identical = 0
+
+            for var in self.var_threshold:
+                if var in self.var_similarity:
+                    score = self.metric(str(record.get(var, '')), str(fields[var]))
+                    n_identical += score > self.confidence
+                else:
+                    score = float(record.get(var, '') == fields[var])
+                    n_identical += score == 1
+                similarity[var] = score
+
+            similarity["score"] = n_identical / len(self.var_threshold)
+            total = sum(similarity[var] for var in self.var_threshold)
+            results.append((-similarity["score"], -total, pos, similarity))
+
+        # ties on the score are broken by the sum of the similarities, then patient_id
+        results.sort(key=lambda x: x[:2] + (self.patient_id[x[2]],))
+        results = [similarity for *_, similarity in results]
+        dataframe = pd.DataFrame(results[:k],
+                                 columns=["patient_id"] + self.var_threshold + ["score"])
+        dataframe["duplicate"] = dataframe.score >= self.threshold
+        return dataframe
+
+    def __insert__(self, record, patient_id):
+        """
+        Store the fields of a prepared record and reference it in each blocking index.
+        """
+        self.fields.append({var: record.get(var, '') for var in self.var_threshold})
+        self.patient_id.append(patient_id)
+        pos = len(self.fields) - 1
+
+        for name, key in self.blocking.items():
+            value = key(record)
+            if str(value).strip():
+                self.index[name][value].append(pos)
@@ -0,0 +1,346 @@
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+import numpy as np
+
+from . import coherence, cube, data, deduplicate, eda, report, store
+from .coherence import clean_pcr, correct_typo, calculate_age, find_best_similar
+from .coherence import gestalt_pattern_matching, postcode_coherence
+from .cube import PrevalenceCube
+from .data import get_gender, get_postcode, get_states, load_gender
+from .deduplicate import Duplication, prepare_patient, prepare_pcr
+from .eda import apply_gender, find_truth_age, match_state
+from .report import make_report
+
+
+class Stage:
+    """
+    Step of a Pipeline. The function is called with the outputs of the input
+    stages (in the same order) and the parameters as keyword arguments.
+
+    Parameters
+    ----------
+    name : str, name of the stage
+    func : function computing the output of the stage
+    inputs : list of the names of the input stages
+    params : dictionary of parameters
+    cache : bool, if False the output is never stored and the stage is computed at
+        each run (stages writing files, as the report)
+    depends : list of functions and modules whose source is part of the key of the
+        stage, default is the function of the stage
+    """
+
+    def __init__(self, name, func, inputs=(), params=None, cache=True, depends=None):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.params = {} if params is None else params
+        self.cache = cache
+        self.depends = [func] if depends is None else list(depends)
+
+
+class Pipeline:
+    """
+    Run stages and cache their output on disk. The key of a stage is a hash of the
+    source of its dependencies (see Stage), its parameters and the keys of its input
+    stages, so a stage is computed again when they change upstream. Code which is not
+    in the dependencies (as installed packages) is not seen : use force or clear
+    cache_dir. Independent stages are run concurrently and the time of each stage
+    is reported.
+
+    Parameters
+    ----------
+    stages : list of Stage
+    cache_dir : str, directory of the cached outputs
+    max_workers : int, number of threads running stages
+    """
+
+    def __init__(self, stages, cache_dir='cache', max_workers=None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+
+        for stage in stages:
+            missing = [name for name in stage.inputs if name not in self.stages]
+            if missing:
+                raise ValueError(f"{stage.name} : unknown input stages {missing}")
+
+    def keys(self):
+        """
+        Return the key of each stage.
+        """
+        keys = {}
+
+        def key(name):
+            if name not in keys:
+                stage = self.stages[name]
+                sources = []
+                for dependency in stage.depends:
+                    try:
+                        sources.append(inspect.getsource(dependency))
+                    except (OSError, TypeError):
+                        sources.append(getattr(dependency, '__qualname__', dependency.__name__))
+                content = json.dumps([name, stage.func.__module__, stage.func.__qualname__, sources,
+                                      stage.params, [key(i) for i in stage.inputs]],
+                                     default=str, sort_keys=True)
+                keys[name] = hashlib.sha256(content.encode()).hexdigest()
+            return keys[name]
+
+        for name in self.stages:
+            key(name)
+        return keys
+
+    def run(self, targets=None, force=()):
+        """
+        Compute the target stages, loading cached stages and computing the others.
+
+        Parameters
+        ----------
+        targets : list of stage names, default is all stages
+        force : list of stage names computed even if they are cached
+
+        Return
+        ------
+        outputs : dictionary where keys are the targets and values their output
+        """
+        if targets is None:
+            targets = list(self.stages)
+
+        keys = self.keys()
+        needed = self.__upstream__(targets)
+        to_compute = {name for name in needed
+                      if name in force or not self.stages[name].cache
+                      or not os.path.exists(self.__path__(name, keys[name]))}
+
+        # only outputs used by a computed stage (or a target) are loaded
+        to_load = (set(targets) | {i for name in to_compute for i in self.stages[name].inputs})
+        to_load -= to_compute
+
+        outputs = {}
+        self.timings = {}
+        for name in to_load:
+            start = time.time()
+            with open(self.__path__(name, keys[name]), 'rb') as f:
+                outputs[name] = pickle.load(f)
+            self.timings[name] = ('cached', time.time() - start)
+
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            running = {}
+            waiting = set(to_compute)
+
+            while waiting or running:
+                for name in [n for n in waiting
+                             if all(i in outputs for i in self.stages[n].inputs)]:
+                    waiting.remove(name)
+                    running[executor.submit(self.__compute__, name, keys[name], outputs)] = name
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    outputs[name], seconds = future.result()
+                    self.timings[name] = ('computed', seconds)
+
+        for name in needed - set(self.timings):
+            self.timings[name] = ('unchanged', 0.0)
+        self.timings = pd.DataFrame(self.timings, index=['status', 'seconds']).T
+        self.timings = self.timings.loc[[name for name in self.stages if name in needed]]
+        for name, (status, seconds) in self.timings.iterrows():
+            print(f"{name} : {seconds:.2f}s ({status})")
+
+        return {name: outputs[name] for name in targets}
+
+    def __compute__(self, name, key, outputs):
+        """
+        Compute a stage and save its output in the cache.
+        """
+        stage = self.stages[name]
+        start = time.time()
+        output = stage.func(*[outputs[i] for i in stage.inputs], **stage.params)
+        seconds = time.time() - start
+
+        if stage.cache:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(self.__path__(name, key), 'wb') as f:
+                pickle.dump(output, f)
+        return output, seconds
+
+    def __path__(self, name, key):
+        return os.path.join(self.cache_dir, f"{name}-{key[:16]}.pkl")
+
+    def __upstream__(self, targets):
+        """
+        Return the targets and all the stages they depend on.
+        """
+        needed = set()
+        stack = list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in needed:
+                needed.add(name)
+                stack.extend(self.stages[name].inputs)
+        return needed
+
+
+def file_signature(path):
+    """
+    Return the size and the modification time of a file.
+    """
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime]
+
+
+def load_table(path, table, signature=None):
+    """
+    Read a table of the database.
+    """
+    con = sqlite3.connect(path)
+    dataframe = pd.read_sql(f'select * from {table}', con=con)
+    con.close()
+    return dataframe
+
+
+def clean_tests(df_pcr):
+    """
+    Clean pcr values and find duplicated tests : tests repeated with the same
+    result (not_dupli_pcr) and positive tests of patients with different results
+    (positive_pi).
+    """
+    df_pcr = clean_pcr(df_pcr.copy())
+    all_pcr_duplicated = df_pcr.patient_id[df_pcr.patient_id.duplicated(False)]
+    dupli_pcr_test = df_pcr[df_pcr.duplicated(subset=["patient_id", "pcr"], keep=False)]
+    not_dupli_pcr = df_pcr[df_pcr.duplicated(subset=["patient_id", "pcr"], keep='first')]
+    dupli_pcr_testdiff = df_pcr.loc[np.setdiff1d(all_pcr_duplicated.index, dupli_pcr_test.index)]
+    positive_pi = dupli_pcr_testdiff[dupli_pcr_testdiff.pcr == 'P']
+    return {"df_pcr": df_pcr, "positive_pi": positive_pi, "not_dupli_pcr": not_dupli_pcr}
+
+
+def remove_duplicates(df_patient, tests, **params):
+    """
+    Remove duplicated patients (see Duplication).
+    """
+    duplication = Duplication(df_pcr=tests["df_pcr"], **params)
+    return {"df_patient": duplication.detect_duplicates(df_patient),
+            "removed": duplication.removed}
+
+
+def reconcile_pcr(tests, dedup):
+    """
+    Deduplicate the pcr table and join it with the deduplicated patients.
+    Empty values are set to None.
+    """
+    df_pcr = prepare_pcr(tests["df_pcr"], tests["positive_pi"], tests["not_dupli_pcr"])
+    df = df_pcr.merge(dedup["df_patient"])
+    df = df.replace({'': None})
+    df["date_of_birth"] = pd.to_numeric(df.date_of_birth, errors='coerce')
+    df["age"] = pd.to_numeric(df.age, errors='coerce')
+    return df
+
+
+def infer_gender(df, threshold=3, confidence=85, use_api=True):
+    """
+    Correct typographic errors of given names and infer the gender of each patient.
+    If use_api is False, the last data stored from genderize is used.
+    """
+    given_name = df.given_name.replace(correct_typo(df.given_name, threshold=threshold,
+                                                    confidence=confidence))
+    if use_api:
+        all_gender = get_gender(given_name.dropna().unique())
+    else:
+        all_gender = load_gender()
+    return apply_gender(all_gender, apply_on=given_name)
+
+
+def age_group(df, year=2020):
+    """
+    Estimate the age from the date of birth and compute the age group.
+    """
+    ages = pd.DataFrame({"age": df.age.astype(float),
+                         "age_estimated": calculate_age(df.date_of_birth.copy(), year=year)})
+    ages["age_estimated"] = ages.age_estimated.astype(float)
+    ages["age_group"] = ages.apply(
+        lambda x: find_truth_age(x["age"], x["age_estimated"]), axis=1).replace({None: np.nan})
+    return ages
+
+
+def state_coherence(df):
+    """
+    Correct the states and retain them only when they match the postcode.
+    """
+    state = find_best_similar(df.state, get_states(), gestalt_pattern_matching)
+    str_postcode = [i for i in df.postcode.dropna().unique() if not str(i).isdigit()]
+    state_by_pc = postcode_coherence(df.postcode.copy(), get_postcode(), str_postcode)
+    return pd.Series([match_state(s, p) for s, p in zip(state_by_pc, state)],
+                     index=df.index, name='state')
+
+
+def assemble(df, gender, ages, state):
+    """
+    Build the table of tested patients used by the analysis.
+    """
+    return pd.DataFrame({"pcr": df.pcr, "gender": gender,
+                         "age_group": ages.age_group, "age": ages.age,
+                         "age_estimated": ages.age_estimated, "state": state})
+
+
+def render_report(df, cube, **params):
+    """
+    Render the prevalence report from the table and the cube of the analysis
+    (see make_report).
+    """
+    return make_report(df, cube=cube, **params)
+
+
+def prevalence_pipeline(path='data.db', dedup_params=None, gender_params=None, year=2020,
+                        report_params=None, cache_dir='cache', max_workers=None):
+    """
+    Return the pipeline from the database to the prevalence outputs : load, clean,
+    prepare, deduplicate, reconcile pcr, infer gender / age group / state, aggregate
+    in a PrevalenceCube and render the report.
+
+    Parameters
+    ----------
+    path : str, database
+    dedup_params : dictionary of Duplication parameters (default is the notebook settings)
+    gender_params : dictionary of infer_gender parameters
+    year : int, reference year to estimate the age
+    report_params : dictionary of make_report parameters
+    """
+    if dedup_params is None:
+        dedup_params = {"var_threshold": ['phone_number', 'born_age', 'full_address',
+                                          'full_name', 'localisation'],
+                        "var_similarity": ['localisation', 'full_name', 'full_address',
+                                           'born_age'],
+                        "variable_testing": ['born_age', 'phone_number', 'full_name',
+                                             'full_address'],
+                        "threshold": 0.4, "confidence": 0.8}
+
+    # each stage is keyed on the modules it calls, the tables only on the database
+    signature = file_signature(path)
+    stages = [
+        Stage("patient", load_table, params={"path": path, "table": 'patient',
+                                             "signature": signature}, depends=[]),
+        Stage("pcr", load_table, params={"path": path, "table": 'test',
+                                         "signature": signature}, depends=[]),
+        Stage("tests", clean_tests, ["pcr"], depends=[clean_tests, coherence]),
+        Stage("prepared", prepare_patient, ["patient"], depends=[deduplicate]),
+        Stage("dedup", remove_duplicates, ["prepared", "tests"], dedup_params,
+              depends=[remove_duplicates, deduplicate, store]),
+        Stage("joined", reconcile_pcr, ["tests", "dedup"], depends=[reconcile_pcr, deduplicate]),
+        Stage("gender", infer_gender, ["joined"], gender_params,
+              depends=[infer_gender, coherence, data, eda]),
+        Stage("ages", age_group, ["joined"], {"year": year}, depends=[age_group, coherence, eda]),
+        Stage("state", state_coherence, ["joined"],
+              depends=[state_coherence, coherence, data, eda]),
+        Stage("analysis", assemble, ["joined", "gender", "ages", "state"]),
+        Stage("cube", PrevalenceCube, ["analysis"], depends=[cube]),
+        Stage("report", render_report, ["analysis", "cube"], report_params, cache=False,
+              depends=[render_report, report, eda, data, cube])]
+
+    return Pipeline(stages, cache_dir=cache_dir, max_workers=max_workers)
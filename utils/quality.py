@@ -0,0 +1,293 @@
+import sqlite3
+
+from fuzzywuzzy import process
+import pandas as pd
+import numpy as np
+
+from .coherence import gestalt_pattern_matching
+from .data import get_postcode, get_states
+
+
+def read_chunks(path='data.db', table='patient', chunksize=5000):
+    """
+    Read a table of the database by chunks of rows.
+    """
+    con = sqlite3.connect(path)
+    try:
+        for chunk in pd.read_sql(f'select * from {table}', con, chunksize=chunksize):
+            yield chunk
+    finally:
+        con.close()
+
+
+class HyperLogLog:
+    """
+    Estimate the number of distinct values with 2**precision registers.
+    """
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(2 ** precision, dtype=np.uint8)
+
+    def update(self, values):
+        h = pd.util.hash_array(np.asarray(values, dtype=object))
+        index = (h >> np.uint64(64 - self.precision)).astype(np.int64)
+        rest = (h & np.uint64(2 ** (64 - self.precision) - 1)).astype(float)
+
+        # position of the first 1 bit in the remaining bits
+        rank = (64 - self.precision) - np.frexp(rest)[1] + 1
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m ** 2 / np.sum(2.0 ** -self.registers.astype(float))
+
+        zeros = np.sum(self.registers == 0)
+        if estimate <= 2.5 * m and zeros > 0:
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+
+class CountMin:
+    """
+    Count-min sketch : estimated counts are never below the true counts.
+    """
+
+    def __init__(self, width=2 ** 16, depth=4):
+        self.width = width
+        self.keys = [f"{i:016d}" for i in range(depth)]
+        self.table = np.zeros((depth, width), dtype=np.int64)
+
+    def __columns__(self, values):
+        values = np.asarray(values, dtype=object)
+        return [(pd.util.hash_array(values, hash_key=key) % np.uint64(self.width)).astype(np.int64)
+                for key in self.keys]
+
+    def update(self, values, counts):
+        for row, col in zip(self.table, self.__columns__(values)):
+            np.add.at(row, col, counts)
+
+    def estimate(self, values):
+        if len(values) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.min([row[col] for row, col in zip(self.table, self.__columns__(values))], axis=0)
+
+
+class QualityProfiler:
+    """
+    Profile the quality of the patient table in a single pass over chunks of rows :
+    missing values, incoherence between postcode and state, incoherence between
+    age and date of birth, number of distinct values and frequent / unique values
+    (used by correct_typo). In the default mode memory is bounded by sketches
+    (HyperLogLog for distinct values, count-min with a frequent items summary
+    for counts). With exact=True the values are counted exactly (small tables).
+
+    Parameters
+    ----------
+    exact : bool, count values exactly instead of using sketches
+    typo_columns : columns whose frequent and unique values are kept
+    years : reference years used to compute the age from the date of birth
+    precision : int, precision of HyperLogLog
+    width : int, width of count-min sketch
+    depth : int, depth of count-min sketch
+    n_frequent : int, size of the frequent items summary
+    n_unique : int, maximum number of unique values candidates kept
+    """
+
+    def __init__(self, exact=False, typo_columns=('address_1', 'suburb', 'given_name'),
+                 years=(2019, 2020, 2021), precision=14, width=2 ** 16, depth=4,
+                 n_frequent=1000, n_unique=100000):
+
+        self.exact = exact
+        self.typo_columns = list(typo_columns)
+        self.years = list(years)
+        self.precision = precision
+        self.width = width
+        self.depth = depth
+        self.n_frequent = n_frequent
+        self.n_unique = n_unique
+
+        self.n = 0
+        self.columns = None
+        self.na = None
+        self.incoherence = {"postcode_state": 0, "age": 0}
+        self.unknown = {"postcode_state": 0, "age": 0}
+
+        # state of each postcode and best match of each state value
+        self.state_by_postcode = np.full(10000, None, dtype=object)
+        for state, postcodes in get_postcode().items():
+            self.state_by_postcode[postcodes] = state
+        self.states = get_states()
+        self.corrected_state = {}
+
+    def profile(self, path='data.db', chunksize=5000):
+        """
+        Stream the patient table of a database and profile it.
+        """
+        for chunk in read_chunks(path, 'patient', chunksize):
+            self.update(chunk)
+        return self
+
+    def update(self, chunk):
+        """
+        Add a chunk of rows to the profile.
+        """
+        if self.columns is None:
+            self.__init_columns__(list(chunk.columns))
+
+        self.n += len(chunk)
+        self.na += chunk[self.columns].isna().sum()
+
+        for col in self.columns:
+            values = chunk[col].dropna()
+            if self.exact:
+                self.counts[col] = self.counts[col].add(values.value_counts(), fill_value=0)
+            else:
+                self.distinct_sketch[col].update(values.values)
+                if col in self.typo_columns:
+                    self.__update_counts__(col, values.value_counts())
+
+        self.__coherence__(chunk)
+        return self
+
+    def missing(self):
+        """
+        Return the pourcentage of missing values for each column (see plot_na).
+        """
+        return self.na / self.n * 100
+
+    def distinct(self):
+        """
+        Return the number of distinct values (estimated) for each column.
+        """
+        if self.exact:
+            return pd.Series({col: len(self.counts[col]) for col in self.columns})
+        return pd.Series({col: self.distinct_sketch[col].estimate() for col in self.columns})
+
+    def summary(self):
+        """
+        Return missing pourcentage, number of distinct values and incoherences.
+        """
+        dataframe = pd.DataFrame({"missing": self.missing(), "distinct": self.distinct()})
+        incoherence = pd.DataFrame({"incoherent": self.incoherence, "unknown": self.unknown})
+        return dataframe, incoherence
+
+    def frequent(self, col, threshold=10):
+        """
+        Return the values of a column appearing more than threshold times with their count.
+        """
+        if self.exact:
+            counts = self.counts[col]
+        else:
+            values = self.frequent_items[col].index
+            counts = pd.Series(self.count_sketch[col].estimate(values.values), index=values)
+        return counts[counts > threshold].sort_values(ascending=False).astype(int)
+
+    def singletons(self, col):
+        """
+        Return the values of a column appearing only once.
+        """
+        if self.exact:
+            counts = self.counts[col]
+            return list(counts.index[counts == 1])
+
+        candidates = list(self.unique_candidates[col])
+        estimate = self.count_sketch[col].estimate(candidates)
+        return [value for value, count in zip(candidates, estimate) if count == 1]
+
+    def correct_typo(self, col, confidence=90, threshold=10):
+        """
+        Correct typographic errors as coherence.correct_typo, from the profile
+        instead of the whole serie.
+        """
+        typo_corrected = {}
+        frequent = self.frequent(col, threshold).index
+
+        for i in self.singletons(col):
+            b_extract = process.extractOne(i, frequent)
+            if b_extract is not None and b_extract[1] > confidence:
+                typo_corrected[i] = b_extract[0]
+
+        return typo_corrected
+
+    def __init_columns__(self, columns):
+        """
+        Create the counters of each column.
+        """
+        self.columns = columns
+        self.na = pd.Series(0, index=columns)
+
+        if self.exact:
+            self.counts = {col: pd.Series(dtype=float) for col in columns}
+        else:
+            self.distinct_sketch = {col: HyperLogLog(self.precision) for col in columns}
+            self.count_sketch = {col: CountMin(self.width, self.depth) for col in self.typo_columns}
+            self.frequent_items = {col: pd.Series(dtype=float) for col in self.typo_columns}
+            self.unique_candidates = {col: set() for col in self.typo_columns}
+
+    def __update_counts__(self, col, counts):
+        """
+        Update count-min sketch, frequent items summary (Misra-Gries) and the
+        candidates to be unique values (values seen once the first time).
+        """
+        sketch = self.count_sketch[col]
+        is_new = sketch.estimate(counts.index.values) == 0
+        sketch.update(counts.index.values, counts.values)
+
+        candidates = self.unique_candidates[col]
+        for value in counts.index[is_new & (counts.values == 1)]:
+            if len(candidates) >= self.n_unique:
+                break
+            candidates.add(value)
+
+        frequent = self.frequent_items[col].add(counts, fill_value=0)
+        if len(frequent) > self.n_frequent:
+            frequent = frequent - frequent.nlargest(self.n_frequent + 1).iloc[-1]
+            frequent = frequent[frequent > 0]
+        self.frequent_items[col] = frequent
+
+    def __coherence__(self, chunk):
+        """
+        Count incoherences between postcode and state, and between age and date of birth.
+        """
+        if {'postcode', 'state'}.issubset(chunk.columns):
+            postcode = pd.to_numeric(chunk.postcode, errors='coerce').values
+            known = ~np.isnan(postcode) & (postcode >= 0) & (postcode < 10000)
+            state_by_pc = np.full(len(chunk), None, dtype=object)
+            state_by_pc[known] = self.state_by_postcode[postcode[known].astype(int)]
+
+            state = chunk.state.map(self.__correct_state__).values
+            is_unknown = pd.isna(state_by_pc) | pd.isna(state)
+            self.unknown["postcode_state"] += int(is_unknown.sum())
+            self.incoherence["postcode_state"] += int((~is_unknown & (state_by_pc != state)).sum())
+
+        if {'age', 'date_of_birth'}.issubset(chunk.columns):
+            date = chunk.date_of_birth.values.astype(float)
+            age = chunk.age.values.astype(float)
+            is_unknown = np.isnan(date) | np.isnan(age) | (date <= 0)
+
+            # year of birth : first four digits of the date (see calculate_age)
+            digits = np.floor(np.log10(np.where(is_unknown, 1, date))) + 1
+            year = np.floor(date / 10 ** (digits - 4))
+            match = np.any([age == y - year for y in self.years], axis=0)
+
+            self.unknown["age"] += int(is_unknown.sum())
+            self.incoherence["age"] += int((~is_unknown & ~match).sum())
+
+    def __correct_state__(self, value):
+        """
+        Return the most similar state code of a value (see coherence.find_best_similar).
+        """
+        if value is None or value != value:
+            return None
+
+        if value not in self.corrected_state:
+            best_ratio = 0
+            for code in self.states.values():
+                ratio = gestalt_pattern_matching(code.lower(), value)
+                if ratio >= best_ratio:
+                    best_ratio = ratio
+                    value_close = code
+            self.corrected_state[value] = value_close
+        return self.corrected_state[value]
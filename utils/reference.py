@@ -0,0 +1,15 @@
+import numpy as np
+
+
+def reference_priority(df_patient, df_pcr):
+    """
+    Return for each patient its priority to be chosen as reference observation
+    of a cluster (see Duplication.__make_cluster__) : 2 if the patient is tested 
+    positive, 1 if the patient is tested, else 0.
+    """
+    if df_pcr is None:
+        return np.zeros(len(df_patient), dtype=int)
+
+    is_tested = df_patient.patient_id.isin(df_pcr.patient_id)
+    is_positive = df_patient.patient_id.isin(df_pcr.patient_id[df_pcr.pcr == "P"])
+    return is_tested.values.astype(int) + is_positive.values.astype(int)
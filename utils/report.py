@@ -0,0 +1,196 @@
+import hashlib
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from .cube import PrevalenceCube
+from .data import get_map, get_states
+from .eda import plot_map, plot_bar_PN, plot_crosstab, plot_dist, plot_hist_age
+
+
+def plot_state_map(data, ax, fig, map_cache=None, **kwargs):
+    """
+    Plot a serie indexed by state on the map of Australia (see load_map for map_cache).
+    """
+    map_df = get_map(get_states(), cache_dir=map_cache)
+    plot_map(map_df.merge(data, on='state'), data.name, ax=ax, fig=fig, **kwargs)
+
+
+def plot_cube_bar(data, ax, fig, var, **kwargs):
+    """
+    Plot the pcr results for a variable of a PrevalenceCube (see plot_bar_PN).
+    """
+    plot_bar_PN(None, None, var, cube=data, ax=ax, **kwargs)
+
+
+def plot_cube_hist(data, ax, fig, **kwargs):
+    """
+    Plot the pcr results by age group of a PrevalenceCube (see plot_hist_age).
+    """
+    plot_hist_age(None, ax=ax, cube=data, **kwargs)
+
+
+def plot_table(data, ax, fig, **kwargs):
+    """
+    Plot a crosstab as a heatmap (see plot_crosstab).
+    """
+    plot_crosstab(data, ax=ax, **kwargs)
+
+
+def plot_ages(data, ax, fig, **kwargs):
+    """
+    Plot the distributions of the age and of the estimated age (see plot_dist).
+    """
+    plot_dist(data[0], data[1], ax=ax, **kwargs)
+    ax.set_ylabel('Fréquence')
+
+
+def report_figures(df, map_cache=None, cube=None):
+    """
+    Return the figures of the prevalence report. Each figure is a dictionary with its name,
+    the plotting function, the aggregated data given to this function and its arguments.
+
+    Parameters
+    ----------
+    df : dataframe of tested patients with columns pcr, gender, age_group and state
+        (and optionally age and age_estimated)
+    map_cache : str, directory of the stored map (see load_map)
+    cube : PrevalenceCube of df, default is computed from df
+    """
+    if cube is None:
+        cube = PrevalenceCube(df)
+
+    figures = [
+        {"name": "map_positive", "plot": plot_state_map, "figsize": (12, 8),
+         "data": cube.counts('state', pcr='P').rename('pcr'),
+         "kwargs": {"cmap": 'Oranges', "title": 'Nombre de patients testés positifs',
+                    "map_cache": map_cache}},
+        {"name": "map_ratio", "plot": plot_state_map, "figsize": (12, 8),
+         "data": cube.prevalence('state').round(3),
+         "kwargs": {"cmap": 'Oranges', "title": "Ratio du nombre de patients positifs "
+                    "sur le nombre de patients testés", "map_cache": map_cache}},
+        {"name": "bar_gender", "plot": plot_cube_bar, "figsize": (14, 4.5),
+         "data": cube.project(['gender', 'pcr']),
+         "kwargs": {"var": 'gender', "y": 100, "x": -0.03, "sort": False, "print_none": False,
+                    "title": 'Répartition des résultats des tests PCR selon le sexe'}},
+        {"name": "crosstab_positive", "plot": plot_table, "figsize": (14, 4.5),
+         "data": cube.crosstab('gender', 'age_group', normalize=True, pcr='P'),
+         "kwargs": {"title": "Répartition en % des cas positifs selon l'age et le genre"}},
+        {"name": "hist_age", "plot": plot_cube_hist, "figsize": (14, 4.5),
+         "data": cube.project(['age_group', 'pcr']),
+         "kwargs": {"x": (-0.17, 20), "y": (0.1, 20), "ylabel": 'Nombre de tests',
+                    "title": "Résultats des tests pcr selon la tranche d'âge"}}]
+
+    if {'age', 'age_estimated'}.issubset(df.columns):
+        figures.append(
+            {"name": "dist_age", "plot": plot_ages, "figsize": (14, 4.5),
+             "data": (df.age[df.age.notnull()].astype(float).values,
+                      df.age_estimated[df.age_estimated.notnull()].astype(float).values),
+             "kwargs": {"title": 'Distribution des âges des patients testés',
+                        "label": ('age renseigné', "age estimé par l'année de naissance")}})
+    return figures
+
+
+def make_report(df, output='report', formats=('png',), processes=None, figures=None,
+                map_cache=None, cube=None):
+    """
+    Render the figures of the prevalence report in files, with a non-interactive backend
+    and a pool of processes. The processes are spawned (not forked), so the report can be
+    made from a thread (see Pipeline) ; in a script, call it under
+    if __name__ == '__main__'. A figure is rendered again only if the hash of its aggregated
+    data and arguments differs from the one stored in the index of the report.
+
+    Parameters
+    ----------
+    df : dataframe of tested patients (see report_figures)
+    output : str, directory of the report
+    formats : tuple, file formats (png, svg, etc.)
+    processes : int, number of processes (default is the number of cpu)
+    figures : list of figures, default is report_figures(df, map_cache, cube)
+    map_cache : str, directory of the stored map (see load_map)
+    cube : PrevalenceCube of df (see report_figures)
+
+    Return
+    ------
+    index : dictionary where keys are the figure names and values their hash and files
+    """
+    if figures is None:
+        figures = report_figures(df, map_cache, cube)
+
+    os.makedirs(output, exist_ok=True)
+    fp_index = os.path.join(output, 'index.json')
+    index = {}
+    if os.path.exists(fp_index):
+        with open(fp_index) as f:
+            index = json.load(f)
+
+    to_render = []
+    for figure in figures:
+        key = figure_hash(figure, formats)
+        files = [os.path.join(output, f"{figure['name']}.{fmt}") for fmt in formats]
+        done = index.get(figure["name"], {})
+
+        if done.get("hash") == key and all(os.path.exists(fp) for fp in files):
+            continue
+
+        index[figure["name"]] = {"hash": key, "files": files,
+                                 "title": figure["kwargs"].get("title", '')}
+        to_render.append((figure, files))
+
+    if to_render:
+        with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=use_agg) as executor:
+            list(executor.map(render_figure, *zip(*to_render)))
+
+    with open(fp_index, 'w') as f:
+        json.dump(index, f, indent=2)
+
+    print(f"{len(to_render)} figures rendered, {len(figures) - len(to_render)} unchanged")
+    return index
+
+
+def figure_hash(figure, formats):
+    """
+    Return the content hash of a figure (aggregated data, plotting function and arguments).
+    """
+    def fingerprint(data):
+        if isinstance(data, PrevalenceCube):
+            return [data.dims, data.categories, data.cube.tolist()]
+        if isinstance(data, (pd.Series, pd.DataFrame)):
+            return data.to_json()
+        if isinstance(data, (list, tuple)):
+            return [fingerprint(d) for d in data]
+        if hasattr(data, 'tolist'):
+            return data.tolist()
+        return data
+
+    content = json.dumps([figure["name"], figure["plot"].__name__, figure["figsize"],
+                          fingerprint(figure["data"]), figure["kwargs"], list(formats)],
+                         default=str, sort_keys=True)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def use_agg():
+    """
+    Use the non-interactive backend of matplotlib (no display needed).
+    """
+    import matplotlib.pyplot as plt
+    plt.switch_backend('agg')
+
+
+def render_figure(figure, files):
+    """
+    Plot a figure and save it in each file.
+    """
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=figure["figsize"])
+    figure["plot"](figure["data"], ax=ax, fig=fig, **figure["kwargs"])
+    fig.tight_layout()
+
+    for fp in files:
+        fig.savefig(fp)
+    plt.close(fig)
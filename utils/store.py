@@ -0,0 +1,228 @@
+import itertools
+import json
+import sqlite3
+
+from jellyfish import jaro_winkler_similarity
+import pandas as pd
+import numpy as np
+
+from .reference import reference_priority
+
+
+def save_scores(path, df_patient, duplication, scored):
+    """
+    Write the candidate pairs compared by a Duplication run and their raw scores
+    in a SQLite file. Scores are stored before applying the confidence, so that
+    the decision can be replayed later with other settings. The values of the
+    compared columns (var_threshold and var_similarity) are also stored, so the
+    file contains patient data.
+
+    Parameters
+    ----------
+    path : str, SQLite file of the store
+    df_patient : dataframe given to detect_duplicates
+    duplication : Duplication object used for the run
+    scored : list of (index, reference index, raw scores) computed during the run
+    """
+    all_columns = list(df_patient.columns)
+    var_similarity = list(all_columns if duplication.var_similarity is None
+                          else duplication.var_similarity)
+    var_threshold = list(all_columns if duplication.var_threshold is None
+                         else duplication.var_threshold)
+
+    # only the compared columns are stored (scores and values)
+    columns = [col for col in all_columns if col in var_threshold or col in var_similarity]
+    kept = [all_columns.index(col) for col in columns]
+    position = df_patient.index.get_indexer
+
+    rows = pd.DataFrame({"label": df_patient.index,
+                         "priority": reference_priority(df_patient, duplication.df_pcr),
+                         "sorted_order": np.argsort(np.argsort(df_patient.index, kind='stable'))})
+    if 'patient_id' in all_columns:
+        rows["patient_id"] = df_patient.patient_id.values
+    for variable in duplication.variable_testing:
+        rows[f"code_{variable}"] = pd.factorize(df_patient[variable])[0]
+
+    pairs = pd.DataFrame([[raw[i] for i in kept] for _, _, raw in scored],
+                         columns=columns, dtype=float)
+    pairs.insert(0, "row_index", position([line for line, _, _ in scored]))
+    pairs.insert(1, "ref_index", position([ref for _, ref, _ in scored]))
+
+    settings = {"columns": columns,
+                "variable_testing": list(duplication.variable_testing),
+                "var_similarity": var_similarity,
+                "var_threshold": var_threshold,
+                "confidence": duplication.confidence,
+                "threshold": duplication.threshold,
+                "remove_dupli_pi": duplication.remove_dupli_pi}
+
+    con = sqlite3.connect(path)
+    rows.to_sql("rows", con, if_exists="replace", index=False)
+    pairs.to_sql("pairs", con, if_exists="replace", index=False)
+    df_patient[columns].to_sql("records", con, if_exists="replace", index=False)
+    pd.DataFrame({"key": list(settings),
+                  "value": [json.dumps(v) for v in settings.values()]}).to_sql(
+                      "settings", con, if_exists="replace", index=False)
+    con.close()
+
+
+class ScoreStore:
+    """
+    Re-decide duplicates from the scores saved by Duplication(store=path), without
+    running the clustering and the metric again. Clusters are replayed variable by
+    variable as in detect_duplicates and the decision is vectorized over all pairs.
+    Pairs that were never compared (a reference removed by an earlier variable
+    for instance) are scored once with the metric and added to the store.
+
+    Parameters
+    ----------
+    path : str, SQLite file written by Duplication
+    metric : function to compare string (default is Jaro Winkler similarity)
+    """
+
+    def __init__(self, path, metric=None):
+        self.path = path
+
+        if metric is None:
+            self.metric = jaro_winkler_similarity
+        else :
+            self.metric = metric
+
+        con = sqlite3.connect(path)
+        settings = pd.read_sql("select * from settings", con)
+        self.settings = {k: json.loads(v) for k, v in zip(settings.key, settings.value)}
+        self.rows = pd.read_sql("select * from rows", con)
+        pairs = pd.read_sql("select * from pairs", con)
+        con.close()
+
+        self.columns = self.settings["columns"]
+        self.similar = np.isin(self.columns, self.settings["var_similarity"])
+        self.n = len(self.rows)
+        self.records = None
+
+        keys = pairs.row_index.values.astype(np.int64) * self.n + pairs.ref_index.values
+        order = np.argsort(keys)
+        self.keys = keys[order]
+        self.scores = pairs[self.columns].values.astype(float)[order]
+
+    def redecide(self, confidence=None, threshold=None, var_threshold=None):
+        """
+        Apply new settings on the stored scores. Settings left to None keep
+        the value used to build the store. var_threshold can only use the stored
+        columns (var_threshold and var_similarity of the Duplication run).
+
+        Return
+        ------
+        kept : index of the observations kept after deduplication
+        """
+        if confidence is None:
+            confidence = self.settings["confidence"]
+        if threshold is None:
+            threshold = self.settings["threshold"]
+        if var_threshold is None:
+            var_threshold = self.settings["var_threshold"]
+
+        not_stored = [var for var in var_threshold if var not in self.columns]
+        if not_stored:
+            raise ValueError(f"Variables not stored : {not_stored}")
+        cols = [self.columns.index(var) for var in var_threshold]
+        alive = np.ones(self.n, dtype=bool)
+        priority = self.rows.priority.values
+
+        for k, variable in enumerate(self.settings["variable_testing"]):
+            codes = self.rows[f"code_{variable}"].values
+
+            # detect_duplicates keeps the input order for the first variable,
+            # then the dataframe is sorted by index
+            order = np.arange(self.n) if k == 0 else self.rows.sorted_order.values
+
+            idx = np.flatnonzero(alive & (codes >= 0))
+            idx = idx[np.lexsort((order[idx], -priority[idx], codes[idx]))]
+            clus = codes[idx]
+            first = np.r_[True, clus[1:] != clus[:-1]]
+            group = np.cumsum(first) - 1
+
+            lines = idx[~first]
+            refs = idx[first][group[~first]]
+            if len(lines) == 0:
+                continue
+
+            scores = self.__lookup__(lines, refs)[:, cols]
+            match = np.where(self.similar[cols], scores > confidence, scores == 1)
+            duplicate = match.sum(axis=1) / len(cols) >= threshold
+            alive[lines[duplicate]] = False
+
+        if self.settings["remove_dupli_pi"] and "patient_id" in self.rows.columns:
+            idx = np.flatnonzero(alive)
+            alive[idx[self.rows.patient_id.iloc[idx].duplicated(False).values]] = False
+
+        self.removed = round(1 - (alive.sum() / self.n), 2)
+        return pd.Index(self.rows.label.values[alive])
+
+    def sweep(self, confidence, threshold, var_threshold=None):
+        """
+        Re-decide duplicates for a grid of settings.
+
+        Parameters
+        ----------
+        confidence : list of confidence values
+        threshold : list of threshold values
+        var_threshold : list of var_threshold lists, default keeps the stored one
+
+        Return
+        ------
+        dataframe : removed pourcentage for each combination of settings
+        """
+        if var_threshold is None:
+            var_threshold = [self.settings["var_threshold"]]
+
+        results = []
+        for conf, thres, var in itertools.product(confidence, threshold, var_threshold):
+            self.redecide(conf, thres, var)
+            results.append({"confidence": conf, "threshold": thres,
+                            "var_threshold": tuple(var), "removed": self.removed})
+        return pd.DataFrame(results)
+
+    def __lookup__(self, lines, refs):
+        """
+        Return the raw scores of the pairs (line, ref), scoring the missing ones.
+        """
+        keys = lines.astype(np.int64) * self.n + refs
+        pos = np.searchsorted(self.keys, keys)
+        found = pos < len(self.keys)
+        found[found] = self.keys[pos[found]] == keys[found]
+
+        if not found.all():
+            self.__score_missing__(lines[~found], refs[~found])
+            pos = np.searchsorted(self.keys, keys)
+
+        return self.scores[pos]
+
+    def __score_missing__(self, lines, refs):
+        """
+        Compute the raw scores of new pairs and add them to the store.
+        """
+        if self.records is None:
+            con = sqlite3.connect(self.path)
+            self.records = pd.read_sql("select * from records", con)[self.columns].values
+            con.close()
+
+        scores = np.empty((len(lines), len(self.columns)))
+        for i, (line, ref) in enumerate(zip(lines, refs)):
+            for j, var in enumerate(self.columns):
+                if self.similar[j]:
+                    scores[i, j] = self.metric(self.records[line, j], self.records[ref, j])
+                else:
+                    scores[i, j] = self.records[line, j] == self.records[ref, j]
+
+        pairs = pd.DataFrame(scores, columns=self.columns)
+        pairs.insert(0, "row_index", lines)
+        pairs.insert(1, "ref_index", refs)
+        con = sqlite3.connect(self.path)
+        pairs.to_sql("pairs", con, if_exists="append", index=False)
+        con.close()
+
+        keys = np.concatenate([self.keys, lines.astype(np.int64) * self.n + refs])
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.scores = np.concatenate([self.scores, scores])[order]